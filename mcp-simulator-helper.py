@@ -5,9 +5,10 @@ This script demonstrates how to invoke XcodeBuildMCP tools programmatically.
 Note: This is a reference implementation. The actual MCP tools are only available within Claude.
 """
 
-import json
+import os
 import subprocess
 import sys
+import threading
 from pathlib import Path
 
 # Configuration
@@ -19,6 +20,11 @@ PROJECT_PATH = PROJECT_ROOT / "ClaudeCodeUI-iOS" / "ClaudeCodeUI.xcodeproj"
 BUILD_DIR = PROJECT_ROOT / "build"
 LOGS_DIR = PROJECT_ROOT / "logs"
 
+# Files that feed the app build, used to decide whether a rebuild can be skipped
+BUILD_INPUT_SUFFIXES = (".swift", ".plist", ".storyboard", ".xib", ".strings",
+                        ".entitlements", ".resolved", ".pbxproj", ".xcscheme")
+BUILD_INPUT_BUNDLES = (".xcassets", ".xcdatamodeld")
+
 class SimulatorMCPHelper:
     """Helper class to demonstrate MCP tool usage patterns"""
     
@@ -28,11 +34,21 @@ class SimulatorMCPHelper:
         self.scheme = SCHEME
         self.bundle_id = BUNDLE_ID
         self.build_dir = str(BUILD_DIR)
+        self._app_path = None
+        self._output = threading.local()
+        
+    def _print(self, line):
+        """Print, or buffer the line if the current thread is collecting output"""
+        lines = getattr(self._output, "lines", None)
+        if lines is None:
+            print(line)
+        else:
+            lines.append(line)
         
     def mcp_boot_sim(self):
         """Boot simulator using MCP tool pattern"""
-        print(f"MCP Command: mcp__XcodeBuildMCP__boot_sim")
-        print(f"  simulatorUuid: {self.simulator_uuid}")
+        self._print(f"MCP Command: mcp__XcodeBuildMCP__boot_sim")
+        self._print(f"  simulatorUuid: {self.simulator_uuid}")
         # In actual MCP context, this would be:
         # await mcp__XcodeBuildMCP__boot_sim({"simulatorUuid": self.simulator_uuid})
         
@@ -42,13 +58,13 @@ class SimulatorMCPHelper:
         
     def mcp_open_sim(self):
         """Open simulator window using MCP tool pattern"""
-        print(f"MCP Command: mcp__XcodeBuildMCP__open_sim")
+        self._print(f"MCP Command: mcp__XcodeBuildMCP__open_sim")
         # In actual MCP context: await mcp__XcodeBuildMCP__open_sim()
         
         # Fallback to open command
         subprocess.run(["open", "-a", "Simulator"])
         
-    def mcp_build_sim(self):
+    def mcp_build_sim(self, clean=False):
         """Build app for simulator using MCP tool pattern"""
         print(f"MCP Command: mcp__XcodeBuildMCP__build_sim")
         print(f"  projectPath: {self.project_path}")
@@ -66,7 +82,16 @@ class SimulatorMCPHelper:
         #     "derivedDataPath": self.build_dir
         # })
         
-        # Fallback to xcodebuild
+        # Skip the build entirely if nothing changed since the last successful one
+        hash_file = BUILD_DIR / ".last_build_hash"
+        source_hash = self._source_hash()
+        if (not clean and hash_file.exists()
+                and hash_file.read_text().strip() == source_hash
+                and self._find_app_path()):
+            print("Sources unchanged since last successful build, skipping xcodebuild")
+            return
+        
+        # Fallback to xcodebuild (incremental unless a clean build is requested)
         cmd = [
             "xcodebuild",
             "-project", self.project_path,
@@ -74,14 +99,36 @@ class SimulatorMCPHelper:
             "-destination", f"platform=iOS Simulator,id={self.simulator_uuid}",
             "-derivedDataPath", self.build_dir,
             "-configuration", "Debug",
-            "clean", "build",
+            "-parallelizeTargets",
+            "-jobs", str(os.cpu_count() or 1),
+            "-quiet",
+        ]
+        if clean:
+            cmd.append("clean")
+        cmd += [
+            "build",
             "CODE_SIGN_IDENTITY=",
             "CODE_SIGNING_REQUIRED=NO"
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"Build failed: {result.stderr}")
+        
+        # Stream the build log to disk instead of buffering it in memory
+        LOGS_DIR.mkdir(exist_ok=True)
+        from datetime import datetime
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        build_log = LOGS_DIR / f"build_{timestamp}.log"
+        with open(build_log, "w") as f:
+            process = subprocess.Popen(cmd, stdout=f, stderr=subprocess.STDOUT)
+            returncode = process.wait()
+        if returncode != 0:
+            tail = build_log.read_text(errors="replace").splitlines()[-20:]
+            print("Build failed:")
+            print("\n".join(tail))
+            print(f"Full build log: {build_log}")
             sys.exit(1)
+        
+        BUILD_DIR.mkdir(exist_ok=True)
+        hash_file.write_text(source_hash)
             
     def mcp_get_app_path(self):
         """Get app path after build using MCP tool pattern"""
@@ -95,17 +142,59 @@ class SimulatorMCPHelper:
         # app_path = await mcp__XcodeBuildMCP__get_sim_app_path({...})
         
         # Fallback to finding the app
-        app_path = BUILD_DIR / "Build" / "Products" / "Debug-iphonesimulator" / "ClaudeCodeUI.app"
-        if app_path.exists():
-            return str(app_path)
+        return self._find_app_path()
         
-        # Search for it
-        import glob
-        apps = glob.glob(str(BUILD_DIR / "**" / "*.app"), recursive=True)
-        if apps:
-            return apps[0]
+    def _find_app_path(self):
+        """Locate the built app bundle, caching the result"""
+        if self._app_path:
+            return self._app_path
+        
+        products_dir = BUILD_DIR / "Build" / "Products"
+        app_path = products_dir / "Debug-iphonesimulator" / "ClaudeCodeUI.app"
+        if app_path.exists():
+            self._app_path = str(app_path)
+            return self._app_path
+        
+        # Only look in the per-configuration products dirs, not the whole derived data tree
+        if products_dir.is_dir():
+            for products in products_dir.iterdir():
+                if not products.name.endswith("-iphonesimulator"):
+                    continue
+                for app in products.glob("*.app"):
+                    self._app_path = str(app)
+                    return self._app_path
         return None
         
+    def _source_hash(self):
+        """Hash paths and mtimes of every build input under the source tree"""
+        import hashlib
+        
+        source_root = PROJECT_PATH.parent
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(source_root):
+            # Prune hidden dirs (Tuist/.build checkouts etc.), backups and docs
+            dirnames[:] = [
+                d for d in dirnames
+                if not d.startswith(".") and ".backup" not in d and d != "docs"
+            ]
+            rel_dir = os.path.relpath(dirpath, source_root)
+            in_bundle = any(part.endswith(BUILD_INPUT_BUNDLES)
+                            for part in Path(rel_dir).parts)
+            for name in filenames:
+                if name.startswith("."):
+                    continue
+                if not in_bundle and not name.endswith(BUILD_INPUT_SUFFIXES):
+                    continue
+                path = os.path.join(dirpath, name)
+                entries.append((os.path.relpath(path, source_root),
+                                os.stat(path).st_mtime_ns))
+        
+        digest = hashlib.sha256()
+        for rel_path, mtime_ns in sorted(entries):
+            digest.update(rel_path.encode() + b"\0")
+            digest.update(mtime_ns.to_bytes(8, "little"))
+        return digest.hexdigest()
+        
     def mcp_install_app(self, app_path):
         """Install app on simulator using MCP tool pattern"""
         print(f"MCP Command: mcp__XcodeBuildMCP__install_app_sim")
@@ -163,7 +252,7 @@ class SimulatorMCPHelper:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         log_file = LOGS_DIR / f"simulator_{timestamp}.log"
         
-        print(f"Starting log capture to: {log_file}")
+        self._print(f"Starting log capture to: {log_file}")
         
         # Start log capture in background
         cmd = [
@@ -180,15 +269,26 @@ class SimulatorMCPHelper:
         pid_file = LOGS_DIR / ".log_pid"
         pid_file.write_text(str(process.pid))
         
-        # Create symlink to latest
-        latest = LOGS_DIR / "latest.log"
-        if latest.exists():
-            latest.unlink()
-        latest.symlink_to(log_file.name)
+        # Point latest.log at the new file via rename so it never goes missing
+        tmp_link = LOGS_DIR / f".latest.{os.getpid()}.tmp"
+        if tmp_link.is_symlink():
+            tmp_link.unlink()
+        os.symlink(log_file.name, tmp_link)
+        os.replace(tmp_link, LOGS_DIR / "latest.log")
         
         return process.pid
         
-    def run_complete_workflow(self):
+    def _prepare_simulator(self, output):
+        """Boot and open the simulator, then start log capture, buffering output"""
+        self._output.lines = output
+        try:
+            self.mcp_boot_sim()
+            self.mcp_open_sim()
+            return self.start_log_capture()
+        finally:
+            del self._output.lines
+        
+    def run_complete_workflow(self, clean=False):
         """Run complete build and launch workflow"""
         print("=" * 60)
         print("MCP Simulator Helper - Complete Workflow")
@@ -196,29 +296,34 @@ class SimulatorMCPHelper:
         print("=" * 60)
         print()
         
-        # 1. Start log capture
-        print("Step 1: Starting log capture...")
-        log_pid = self.start_log_capture()
-        print(f"✓ Log capture started (PID: {log_pid})")
-        print()
-        
-        # 2. Boot simulator
-        print("Step 2: Booting simulator...")
-        self.mcp_boot_sim()
-        print("✓ Simulator booted")
-        print()
-        
-        # 3. Open simulator
-        print("Step 3: Opening simulator window...")
-        self.mcp_open_sim()
-        print("✓ Simulator opened")
-        print()
-        
-        # 4. Build app
-        print("Step 4: Building app...")
-        self.mcp_build_sim()
-        print("✓ App built")
-        print()
+        from concurrent.futures import ThreadPoolExecutor
+        
+        # 1-3. Boot, open and log capture don't depend on the build, so run
+        # them in the background while xcodebuild does its work. They stay
+        # in order (Simulator.app must see the booted device, log stream
+        # needs it booted) and their output is printed after the build.
+        print("Steps 1-3: Booting and opening simulator, starting log capture in background...")
+        prep_output = []
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            prep_future = executor.submit(self._prepare_simulator, prep_output)
+            print()
+            
+            # 4. Build app
+            print("Step 4: Building app...")
+            try:
+                self.mcp_build_sim(clean=clean)
+            except SystemExit:
+                prep_future.exception()
+                print("\n".join(prep_output))
+                raise
+            print("✓ App built")
+            print()
+            
+            log_pid = prep_future.result()
+            print("\n".join(prep_output))
+            print("✓ Simulator booted and opened")
+            print(f"✓ Log capture started (PID: {log_pid})")
+            print()
         
         # 5. Get app path
         print("Step 5: Finding app bundle...")
@@ -260,14 +365,16 @@ def main():
     parser.add_argument("command", nargs="?", default="all",
                        choices=["all", "build", "launch", "screenshot", "boot"],
                        help="Command to execute")
+    parser.add_argument("--clean", action="store_true",
+                       help="Clean before building instead of building incrementally")
     
     args = parser.parse_args()
     helper = SimulatorMCPHelper()
     
     if args.command == "all":
-        helper.run_complete_workflow()
+        helper.run_complete_workflow(clean=args.clean)
     elif args.command == "build":
-        helper.mcp_build_sim()
+        helper.mcp_build_sim(clean=args.clean)
     elif args.command == "launch":
         app_path = helper.mcp_get_app_path()
         if app_path: